@@ -13,23 +13,36 @@
 #
 #  You should have received a copy of the GNU General Public License
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
-from celerite.solver import LinAlgError
-from numpy import asarray, unique, zeros, inf, squeeze, zeros_like, isfinite, log10, diff, sqrt
+from numpy import asarray, unique, zeros, inf, squeeze, zeros_like, isfinite, log10, diff, sqrt, atleast_2d, array_equal, \
+    array, exp
 from astropy.stats import mad_std
 
 try:
     from celerite import GP
+    from celerite.solver import LinAlgError
     from celerite.terms import Matern32Term
     with_celerite = True
 except ImportError:
+    class LinAlgError(Exception):
+        pass
     with_celerite = False
 
+# Use the faster celerite2 solver if available. The celerite and celerite2
+# Matern-3/2 terms are identical, only parameterised differently.
+try:
+    from celerite2 import GaussianProcess
+    from celerite2.driver import LinAlgError as Celerite2LinAlgError
+    from celerite2.terms import Matern32Term as Matern32Term2
+    with_celerite2 = True
+except ImportError:
+    with_celerite2 = False
+
 from ...param import  LParameter, NormalPrior as NP, UniformPrior as UP
 
 class CeleriteLogLikelihood:
     def __init__(self, lpf, name: str = 'gp', noise_ids=None, fixed_hps=None):
-        if not with_celerite:
-            raise ImportError("CeleriteLogLikelihood requires celerite.")
+        if not (with_celerite or with_celerite2):
+            raise ImportError("CeleriteLogLikelihood requires either celerite or celerite2.")
 
         self.name = name
         self.lpf = lpf
@@ -56,7 +69,11 @@ class CeleriteLogLikelihood:
             self.times = lpf.timea[m]
             self.fluxes = lpf.ofluxa[m]
 
-        self.gp = GP(Matern32Term(0, 0))
+        if with_celerite2:
+            self.gp = GaussianProcess(Matern32Term2(sigma=1.0, rho=1.0))
+        else:
+            self.gp = GP(Matern32Term(0, 0))
+        self._computed_hps = None
 
         if self.free:
             self.init_parameters()
@@ -80,21 +97,61 @@ class CeleriteLogLikelihood:
     def compute_gp(self, pv, force: bool = False, hps=None):
         if self.free or force:
             parameters = pv[self.pv_slice] if hps is None else hps
-            self.gp.set_parameter_vector(parameters[:-1])
-            self.gp.compute(self.times, yerr=10 ** parameters[-1])
+
+            # The GP factorisation depends only on the hyperparameters, so
+            # we don't need to recompute it if they haven't changed.
+            if not force and self._computed_hps is not None and array_equal(parameters, self._computed_hps):
+                return
+
+            self._computed_hps = None
+            if with_celerite2:
+                # Raise the same LinAlgError as celerite when the factorisation fails.
+                try:
+                    self.gp.kernel = Matern32Term2(sigma=exp(parameters[0]), rho=exp(parameters[1]))
+                    self.gp.compute(self.times, yerr=10 ** parameters[-1])
+                except (Celerite2LinAlgError, OverflowError):
+                    raise LinAlgError('Could not factorise the GP covariance matrix.')
+            else:
+                self.gp.set_parameter_vector(parameters[:-1])
+                self.gp.compute(self.times, yerr=10 ** parameters[-1])
+            self._computed_hps = array(parameters)
 
     def compute_gp_lnlikelihood(self, pv, model):
         try:
             self.compute_gp(pv)
-            return self.gp.log_likelihood(self.fluxes - model[self.mask])
+            lnlike = self.gp.log_likelihood(self.fluxes - model[self.mask])
+            # celerite2 doesn't raise an error for every failed factorisation, but gives a NaN log likelihood
+            return lnlike if isfinite(lnlike) else -inf
         except LinAlgError:
             return -inf
 
+    def _predict(self, residuals):
+        bl = self.gp.predict(residuals, self.times, return_cov=False)
+        # celerite2 doesn't raise an error for every failed factorisation, but predicts NaNs
+        if with_celerite2 and not isfinite(bl).all():
+            raise LinAlgError('Could not factorise the GP covariance matrix.')
+        return bl
+
     def predict_baseline(self, pv):
         self.compute_gp(pv)
         residuals = self.fluxes - squeeze(self.lpf.transit_model(pv))[self.mask]
         bl = zeros_like(self.lpf.timea)
-        bl[self.mask] = self.gp.predict(residuals, self.times, return_cov=False)
+        bl[self.mask] = self._predict(residuals)
+        return 1. + bl
+
+    def predict_baseline_batch(self, pvp, models=None):
+        """Predicts the GP baseline for a 1D or 2D array of model parameters.
+
+        The transit model is evaluated for all the parameter vectors at once (unless
+        already given as `models`), and the GP factorisation is reused between the
+        parameter vectors that share the same GP hyperparameters.
+        """
+        pvp = atleast_2d(pvp)
+        models = atleast_2d(self.lpf.transit_model(pvp) if models is None else models)
+        bl = zeros((pvp.shape[0], self.lpf.timea.size))
+        for ipv, pv in enumerate(pvp):
+            self.compute_gp(pv)
+            bl[ipv, self.mask] = self._predict(self.fluxes - models[ipv, self.mask])
         return 1. + bl
 
     def __call__(self, pvp, model):
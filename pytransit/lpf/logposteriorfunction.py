@@ -19,15 +19,20 @@ import pandas as pd
 import xarray as xa
 import astropy.io.fits as pf
 
+from functools import partial
+from multiprocessing import get_context
 from pathlib import Path
+from pickle import dumps, loads
 from time import strftime
-from typing import Union, Iterable
+from typing import Union, Iterable, Optional
 
 from astropy.table import Table
 from scipy.optimize import minimize
-from numpy import ndarray, atleast_2d, inf, isfinite, where, clip, diag, full, arange, repeat, tile
-from numpy.random import multivariate_normal
+from numpy import ndarray, atleast_2d, inf, isfinite, where, clip, diag, full, arange, repeat, tile, asarray, \
+    concatenate, sqrt
+from numpy.random import multivariate_normal, randint, default_rng, Generator
 from emcee import EnsembleSampler
+from emcee.backends import Backend
 from matplotlib.pyplot import subplots, setp
 from tqdm.auto import tqdm
 
@@ -35,6 +40,34 @@ from pytransit.utils.de import DiffEvol
 from pytransit.param import ParameterSet, UniformPrior as UP, NormalPrior as NP
 
 
+def _sample_ensemble(pop0: ndarray, lnpost: bytes, niter: int, thin: int, vectorize: bool):
+    # Each ensemble unpickles its own copy of the log posterior function, since the LPF caches
+    # state (such as the GP factorisation) that can't be shared by ensembles run in threads.
+    lnpost = loads(lnpost)
+    sampler = EnsembleSampler(pop0.shape[0], pop0.shape[1], lnpost, vectorize=vectorize)
+    for _ in sampler.sample(pop0, iterations=niter, thin=thin, skip_initial_state_check=False):
+        pass
+    return sampler.chain, sampler.lnprobability, sampler.backend.accepted
+
+
+def gelman_rubin(chains: ndarray) -> ndarray:
+    """Gelman-Rubin potential scale reduction factor.
+
+    Parameters
+    ----------
+    chains: ndarray
+        Samples from independent chains as an array with a shape [nchains, nsamples, nparameters].
+
+    Returns
+    -------
+        The potential scale reduction factor R for each parameter.
+    """
+    n = chains.shape[1]
+    w = chains.var(1, ddof=1).mean(0)
+    b = n * chains.mean(1).var(0, ddof=1)
+    return sqrt(((n - 1) / n * w + b / n) / w)
+
+
 class LogPosteriorFunction:
     _lpf_name = 'LogPosteriorFunction'
 
@@ -207,11 +240,130 @@ class LogPosteriorFunction:
                 self.save(self.result_dir)
             pop0 = self.sampler.chain[:, -1, :].copy()
 
+    def sample_mcmc_parallel(self, niter: int = 500, thin: int = 5, nchains: int = 4, population=None,
+                             nprocesses: Optional[int] = None, save=False, pool=None,
+                             lnpost=None, vectorize: bool = True, burn: int = 0) -> ndarray:
+        """Samples the posterior with independent MCMC ensembles run in parallel processes.
+
+        Runs `nchains` independent emcee ensembles in parallel and merges them into a single sampler with
+        `nchains * npop` walkers, so that the results can be accessed using `posterior_samples` as usual.
+        The ensembles sample the same posterior, so they are given equal weights in the merge.
+
+        The ensembles are run using the `map` method of `pool`. If no pool is given, a new process pool is
+        created using the 'spawn' start method, which doesn't inherit the numba threading state from the
+        parent process. Each ensemble samples with its own unpickled copy of the log posterior function,
+        also when run in a thread pool, so the LPF class needs to be importable by the workers (that is,
+        not defined interactively in a notebook) when a process pool is used.
+
+        Parameters
+        ----------
+        niter: int
+            Number of MCMC iterations per ensemble.
+        thin: int
+            Thinning factor.
+        nchains: int
+            Number of independent ensembles.
+        population: ndarray, optional
+            Initial populations with a shape [nchains, npop, npar] or a single initial population with a
+            shape [npop, npar] shared by all the ensembles.
+        nprocesses: int, optional
+            Number of worker processes if a new pool is created, defaults to `nchains`.
+        pool: optional
+            Pool with a `map` method used to run the ensembles.
+        burn: int
+            Number of thinned samples to discard from the start of each chain before calculating the
+            Gelman-Rubin statistic.
+
+        Returns
+        -------
+            The Gelman-Rubin potential scale reduction factor for each parameter calculated over the ensembles.
+        """
+        if save and self.result_dir is None:
+            raise ValueError('The MCMC sampler is set to save the results, but the result directory is not set.')
+        if not 0 <= burn < niter // thin:
+            raise ValueError(f'The burn-in must be smaller than the number of thinned samples per chain ({niter // thin}).')
+
+        if population is not None:
+            pop0 = asarray(population)
+        elif self.sampler is not None:
+            pop0 = self.sampler.chain[:, -1, :].copy()
+            if pop0.shape[0] % nchains != 0:
+                raise ValueError(f'Cannot split the {pop0.shape[0]} walkers of the existing sampler '
+                                 f'evenly into {nchains} chains.')
+            pop0 = pop0.reshape([nchains, -1, pop0.shape[1]])
+        elif self.de is not None:
+            pop0 = self.de.population.copy()
+        else:
+            raise ValueError('Sample MCMC needs an initial population.')
+
+        if pop0.ndim == 2:
+            pop0 = repeat(pop0[None, :, :], nchains, 0)
+        if pop0.shape[0] != nchains:
+            raise ValueError('The number of initial populations must equal the number of chains.')
+
+        lnpost = lnpost or self.lnposterior
+
+        # Evaluate the log posterior once in the calling thread, so that the numba parallel
+        # kernels are first launched from the main thread. A process where they are first
+        # launched from a worker thread of a thread pool hangs on exit.
+        lnpost(pop0[0] if vectorize else pop0[0, 0])
+
+        run = partial(_sample_ensemble, lnpost=dumps(lnpost), niter=niter, thin=thin, vectorize=vectorize)
+        if pool is None:
+            with get_context('spawn').Pool(nprocesses or nchains) as pool:
+                results = list(pool.map(run, list(pop0)))
+        else:
+            results = list(pool.map(run, list(pop0)))
+
+        chains = concatenate([r[0] for r in results])
+        nwalkers, nsteps, npar = chains.shape
+
+        backend = Backend()
+        backend.reset(nwalkers, npar)
+        backend.grow(nsteps, None)
+        backend.chain[:] = chains.swapaxes(0, 1)
+        backend.log_prob[:] = concatenate([r[1] for r in results]).T
+        backend.accepted[:] = concatenate([r[2] for r in results])
+        backend.iteration = nsteps
+        self.sampler = EnsembleSampler(nwalkers, npar, lnpost, vectorize=vectorize, backend=backend)
+
+        if save:
+            self.save(self.result_dir)
+
+        return gelman_rubin(chains[:, burn:, :].reshape([nchains, -1, npar]))
+
     def posterior_samples(self, burn: int = 0, thin: int = 1):
         fc = self.sampler.chain[:, burn::thin, :].reshape([-1, len(self.ps)])
         df = pd.DataFrame(fc, columns=self.ps.names)
         return df
 
+    def _subsample_posterior(self, k: int = 5000, burn: int = 0, thin: int = 1,
+                             rng: Optional[Generator] = None) -> ndarray:
+        """Draws a random subsample of the MCMC samples.
+
+        The samples are drawn without replacement directly from the sampler chain, so
+        only the `k` selected samples are copied instead of the whole chain.
+
+        Parameters
+        ----------
+        k: int
+            Number of samples to draw. All the samples are returned if the chain contains fewer than `k` samples.
+        rng: Generator, optional
+            Random number generator. The global NumPy random state is used if not given.
+
+        Returns
+        -------
+            A random subsample of the posterior as an array with a shape [k, npar].
+        """
+        chain = self.sampler.chain[:, burn::thin, :]
+        nsteps = chain.shape[1]
+        npt = chain.shape[0] * nsteps
+        # The legacy numpy.random.choice permutes all the samples when drawing without
+        # replacement, so we seed a Generator from the global random state instead.
+        rng = rng if rng is not None else default_rng(randint(2 ** 31, size=4))
+        ids = rng.choice(npt, min(k, npt), replace=False)
+        return chain[ids // nsteps, ids % nsteps, :]
+
     def plot_mcmc_chains(self, pid: int = 0, alpha: float = 0.1, thin: int = 1, ax=None):
         fig, ax = (None, ax) if ax is not None else subplots()
         ax.plot(self.sampler.chain[:, ::thin, pid].T, 'k', alpha=alpha)
@@ -27,9 +27,8 @@ from corner import corner
 from matplotlib.pyplot import setp
 from matplotlib.pyplot import subplots
 from numba import njit
-from numpy import zeros, squeeze, ceil, arange, digitize, full, nan, \
-    sqrt, percentile, isfinite, floor, argsort, ones_like, atleast_2d, median, ndarray, unique, nanmedian, concatenate
-from numpy.random import permutation
+from numpy import zeros, squeeze, ceil, arange, full, nan, \
+    sqrt, percentile, isfinite, floor, argsort, ones_like, ndarray, unique, nanmedian, concatenate, int64, bincount
 from pytransit.utils.tess import read_tess_spoc
 
 from .loglikelihood import CeleriteLogLikelihood
@@ -38,6 +37,7 @@ from .. import TransitModel
 from ..orbits import epoch
 from ..utils.keplerlc import KeplerLC
 from ..utils.misc import fold
+from ..utils.downsample import downsample_lttb
 
 try:
     from ldtk import tess
@@ -45,27 +45,71 @@ try:
 except ImportError:
     with_ldtk = False
 
-@njit
+try:
+    from bottleneck import median
+except ImportError:
+    from numpy import median
+
+@njit(cache=True)
 def downsample_time(time, vals, inttime=1.):
-    duration = time.max() - time.min()
+    t0 = time.min()
+    duration = time.max() - t0
     nbins = int(ceil(duration / inttime))
-    bins = arange(nbins)
-    edges = time[0] + bins * inttime
-    bids = digitize(time, edges) - 1
-    bt, bv, be = full(nbins, nan), zeros(nbins), zeros(nbins)
-    for i, bid in enumerate(bins):
-        bmask = bid == bids
-        if bmask.sum() > 0:
-            bt[i] = time[bmask].mean()
-            bv[i] = vals[bmask].mean()
-            if bmask.sum() > 2:
-                be[i] = vals[bmask].std() / sqrt(bmask.sum())
+    itime = 1.0 / inttime
+
+    # A single point, or a set of points with equal times, spans no bins.
+    if nbins == 0:
+        return zeros(0), zeros(0), zeros(0)
+
+    # Accumulate the per-bin statistics in a single pass over the data
+    # ----------------------------------------------------------------
+    # The bins have a uniform width, so the bin index can be calculated
+    # directly without searching through the bin edges. The means and
+    # variances are accumulated using Welford's online algorithm.
+    nv, st, bv, m2 = zeros(nbins, int64), zeros(nbins), zeros(nbins), zeros(nbins)
+    for i in range(time.size):
+        bid = min(max(int(floor((time[i] - t0) * itime)), 0), nbins - 1)
+        nv[bid] += 1
+        st[bid] += time[i]
+        d = vals[i] - bv[bid]
+        bv[bid] += d / nv[bid]
+        m2[bid] += d * (vals[i] - bv[bid])
+
+    bt, be = full(nbins, nan), zeros(nbins)
+    for i in range(nbins):
+        if nv[i] > 0:
+            bt[i] = st[i] / nv[i]
+            if nv[i] > 2:
+                be[i] = sqrt(m2[i] / nv[i]) / sqrt(nv[i])
             else:
                 be[i] = nan
     m = isfinite(be)
     return bt[m], bv[m], be[m]
 
 
+@njit("i8[:](f8[:], f8)", cache=True)
+def bucket_argsort(x, dx):
+    """Indices that order `x` into buckets of width `dx` using a counting sort.
+
+    The order inside each bucket is the original order, so the indices sort
+    `x` to within `dx` in O(N) time. The values in `x` must be finite.
+    """
+    x0 = x.min()
+    nb = int(floor((x.max() - x0) / dx)) + 1
+    bids = zeros(x.size, int64)
+    starts = zeros(nb + 1, int64)
+    for i in range(x.size):
+        bids[i] = min(int(floor((x[i] - x0) / dx)), nb - 1)
+        starts[bids[i] + 1] += 1
+    for i in range(nb):
+        starts[i + 1] += starts[i]
+    sids = zeros(x.size, int64)
+    for i in range(x.size):
+        sids[starts[bids[i]]] = i
+        starts[bids[i]] += 1
+    return sids
+
+
 class TESSLPF(BaseLPF):
     bjdrefi = 2457000
 
@@ -84,7 +128,7 @@ class TESSLPF(BaseLPF):
             times = concatenate(self.lc.time_per_transit)
             fluxes = concatenate(self.lc.normalized_flux_per_transit)
 
-        tref = floor(concatenate(times).min())
+        tref = floor(min(t.min() for t in self.lc.time_per_transit))
 
         self.zero_epoch = zero_epoch
         self.period = period
@@ -120,8 +164,7 @@ class TESSLPF(BaseLPF):
                 pv = self.de.minimum_location
             elif solution in ('mcmc', 'mc'):
                 solution = 'mcmc'
-                samples = self.posterior_samples(derived_parameters=False)
-                samples = permutation(samples.values)[:n_samples]
+                samples = self._subsample_posterior(n_samples)
                 pv = median(samples, 0)
             else:
                 raise NotImplementedError("'solution' should be either 'local', 'global', or 'mcmc'")
@@ -136,38 +179,40 @@ class TESSLPF(BaseLPF):
 
         [ax.autoscale(enable=True, axis='x', tight=True) for ax in axs.flat]
 
-        def baseline(pvp):
-            pvp = atleast_2d(pvp)
-            bl = zeros((pvp.shape[0], self.ofluxa.size))
-            for i, pv in enumerate(pvp):
-                bl[i] = self._lnlikelihood_models[0].predict_baseline(pv)
-            return bl
+        baseline = self._lnlikelihood_models[0].predict_baseline_batch
+
+        # Evaluate the transit model for all the samples in a single batch, and
+        # share it between the baseline prediction and the model plotting.
+        if solution == 'mcmc':
+            tmodel = self.transit_model(samples)
+            fbasel = median(baseline(samples, tmodel), axis=0)
+        else:
+            tmodel = self.transit_model(pv)
+            fbasel = squeeze(baseline(pv, tmodel))
 
         if remove_baseline:
             if solution == 'mcmc':
-                fbasel = median(baseline(samples), axis=0)
-                fmodel, fmodm, fmodp = percentile(self.transit_model(samples), [50, 0.5, 99.5], axis=0)
+                fmodel, fmodm, fmodp = percentile(tmodel, [50, 0.5, 99.5], axis=0)
             else:
-                fbasel = squeeze(baseline(pv))
-                fmodel, fmodm, fmodp = squeeze(self.transit_model(pv)), None, None
+                fmodel, fmodm, fmodp = squeeze(tmodel), None, None
             fobs = self.ofluxa / fbasel
         else:
             if solution == 'mcmc':
-                fbasel = median(baseline(samples), axis=0)
                 fmodel, fmodm, fmodp = percentile(self.flux_model(samples), [50, 1, 99], axis=0)
             else:
-                fbasel = squeeze(baseline(pv))
                 fmodel, fmodm, fmodp = squeeze(self.flux_model(pv)), None, None
             fobs = self.ofluxa
 
         t0, p = pv[[0, 1]]
 
+        # Calculate the transit centres for all the light curves at once
+        tmeans = bincount(self.lcids, self.timea, self.nlc) / bincount(self.lcids, minlength=self.nlc)
+        tcs = t0 + epoch(tmeans, t0, p) * p
+
         for i, sl in enumerate(self.lcslices):
             ax = axs.flat[i]
             t = self.times[i]
-            e = epoch(t.mean(), t0, p)
-            tc = t0 + e * p
-            tt = 24 * (t - tc)
+            tt = 24 * (t - tcs[i])
             ax.plot(tt, fobs[sl], 'k.', alpha=0.2)
             ax.plot(tt, fmodel[sl], 'k')
 
@@ -183,7 +228,7 @@ class TESSLPF(BaseLPF):
         return fig
 
     def plot_folded_transit(self, method='de', figsize=(13, 6), ylim=(0.9975, 1.002), xlim=None, binwidth=8,
-                            remove_baseline: bool = False):
+                            remove_baseline: bool = False, max_points: Optional[int] = 5000):
         if method == 'de':
             pv = self.de.minimum_location
             tc, p = pv[[0, 1]]
@@ -192,7 +237,11 @@ class TESSLPF(BaseLPF):
 
         phase = p * fold(self.timea, p, tc, 0.5)
         binwidth = binwidth / 24 / 60
-        sids = argsort(phase)
+
+        # Order the data in phase to within a sixtieth of the bin width. This is
+        # enough for plotting and avoids a full O(N log N) sort over all the data.
+        fids = isfinite(phase).nonzero()[0]
+        sids = fids[bucket_argsort(phase[fids], binwidth / 60)]
 
         tm = self.transit_model(pv)
 
@@ -202,12 +251,23 @@ class TESSLPF(BaseLPF):
         else:
             bl = ones_like(self.ofluxa)
 
-        bp, bfo, beo = downsample_time(phase[sids], (self.ofluxa / bl)[sids], binwidth)
+        sphase, sflux, smodel = phase[sids], (self.ofluxa / bl)[sids], tm[sids]
+        bp, bfo, beo = downsample_time(sphase, sflux, binwidth)
+
+        # Plot only visually representative subsets of the unbinned data and the model,
+        # since plotting every cadence from many sectors is slow. The model subset is
+        # sorted exactly, since it is drawn as a line.
+        if max_points is not None:
+            ids = downsample_lttb(sphase, sflux, max_points)
+            mids = downsample_lttb(sphase, smodel, max_points)
+        else:
+            ids = mids = arange(sphase.size)
+        mids = mids[argsort(sphase[mids])]
 
         fig, ax = subplots(figsize=figsize)
-        ax.plot(phase - 0.5 * p, self.ofluxa / bl, '.', alpha=0.15)
+        ax.plot(sphase[ids] - 0.5 * p, sflux[ids], '.', alpha=0.15)
         ax.errorbar(bp - 0.5 * p, bfo, beo, fmt='ko')
-        ax.plot(phase[sids] - 0.5 * p, tm[sids], 'k')
+        ax.plot(sphase[mids] - 0.5 * p, smodel[mids], 'k')
         xlim = xlim if xlim is not None else 1.01 * (bp[isfinite(bp)][[0, -1]] - 0.5 * p)
         setp(ax, ylim=ylim, xlim=xlim, xlabel='Time - Tc [d]', ylabel='Normalised flux')
         fig.tight_layout()
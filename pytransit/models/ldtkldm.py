@@ -17,11 +17,10 @@
 from typing import Tuple, Optional, Union
 from pathlib import Path
 
-from numpy import ndarray, linspace, meshgrid, transpose, asarray, newaxis, errstate
-from numba import njit
+from numpy import ndarray, linspace, meshgrid, transpose, asarray, newaxis, errstate, repeat
 
 from .ldmodel import LDModel
-from .numba.ldtkldm import trilinear_interpolation_set, integrate_profiles_set
+from .numba.ldtkldm import trilinear_interpolation_set, integration_weights
 
 try:
     from ldtk import LDPSetCreator
@@ -30,14 +29,6 @@ except ImportError:
         def __init__(self, *nargs, **kwargs):
             raise ModuleNotFoundError('LDTkLDModel requires LDTk.')
 
-@njit
-def ntrapz(x, y):
-    npt = x.size
-    ii = 0.0
-    for i in range(1, npt):
-        ii += (x[i] - x[i - 1]) * 0.5 * (y[i] + y[i - 1])
-    return ii
-
 
 class LDTkLDModel(LDModel):
     def __init__(self, pbs: Tuple, teff: Tuple[float, float], logg: Tuple[float, float], metal: Tuple[float, float],
@@ -51,11 +42,15 @@ class LDTkLDModel(LDModel):
         self.nmu = 0
         self.ps = None
         self.profiles = None
+        self.weights = None
         self.rgi = None
+        self._cached_sp = None
+        self._cached_ld = None
 
     def _init_interpolation(self, mu):
         self.mu = mu
         self.nmu = mu.size
+        self.weights = integration_weights(mu)
         c = self.sc.client
 
         teffs = linspace(*c.teffl, self.sc.client.nteff)
@@ -70,6 +65,8 @@ class LDTkLDModel(LDModel):
             self.ps = self.sc.create_profiles(teff=teffg.ravel(), logg=loggg.ravel(), metal=zg.ravel())
             self.ps.resample(mu=self.mu)
             self.profiles = transpose(self.ps._ldps.copy(), axes=(1, 0, 2)).reshape((self.nteff, self.nlogg, self.nmetal, self.npb, self.nmu))
+        self._cached_sp = None
+        self._cached_ld = None
 
     def __call__(self, mu: ndarray, x: ndarray) -> Tuple[ndarray, ndarray]:
         if self.mu is None or id(mu) != id(self.mu):
@@ -81,12 +78,32 @@ class LDTkLDModel(LDModel):
         elif x.ndim == 2:
             x = x[:, newaxis, :]
 
-        ldp = trilinear_interpolation_set(self.profiles, x[:, 0, 0], x[:, 0, 1], x[:, 0, 2],
-                                          self.teff0, self.dteff, self.nteff,
-                                          self.logg0, self.dlogg, self.nlogg,
-                                          self.metal0, self.dmetal, self.nmetal)
-        ldi = integrate_profiles_set(self.mu, ldp)
-        return ldp, ldi
+        # The stellar parameters are often shared by the whole parameter vector
+        # population (e.g., when they are fixed), in which case we interpolate the
+        # profiles only once and copy them over to all the parameter vectors.
+        npv = x.shape[0]
+        frozen = npv > 1 and (x[:, 0, :3] == x[0, 0, :3]).all()
+        sp = x[:1, 0, :3] if frozen else x[:, 0, :3]
+
+        # The model is often evaluated repeatedly with the same stellar parameters
+        # (e.g., when plotting or predicting the baseline), so we reuse the
+        # profiles from the previous call if the parameters haven't changed.
+        if self._cached_sp is not None and self._cached_sp.shape == sp.shape and (self._cached_sp == sp).all():
+            ldp, ldi = self._cached_ld
+        else:
+            ldp = trilinear_interpolation_set(self.profiles, sp[:, 0], sp[:, 1], sp[:, 2],
+                                              self.teff0, self.dteff, self.nteff,
+                                              self.logg0, self.dlogg, self.nlogg,
+                                              self.metal0, self.dmetal, self.nmetal)
+            ldi = ldp.dot(self.weights)
+            self._cached_sp, self._cached_ld = sp.copy(), (ldp, ldi)
+
+        # The cached profiles are never handed out directly, so that a caller
+        # modifying the returned arrays can't corrupt the later evaluations.
+        if frozen:
+            return repeat(ldp, npv, 0), repeat(ldi, npv, 0)
+        else:
+            return ldp.copy(), ldi.copy()
 
     def _evaluate(self, mu: ndarray, x: ndarray) -> ndarray:
         raise NotImplementedError
@@ -1,91 +1,85 @@
 from numba import njit, prange
-from numpy import zeros, floor, sqrt, pi
+from numpy import zeros, floor, sqrt, pi, int64
 
 
-@njit
-def trilinear_interpolation_unit_cube(data, x, y, z):
-    """Trilinear interpolation inside a unit cube.
+@njit("Tuple((i8, f8))(f8, f8, f8, i8)", cache=True)
+def grid_cell(x, x0, dx, nx):
+    """Grid cell index and the fractional position inside the cell.
 
-    Implementation taken from Paul Bourke's notes
-    https://paulbourke.net/miscellaneous/interpolation
+    The position is clamped to the grid, so the cell index is always between 0 and nx - 2.
     """
-    n1 = data.shape[3]
-    n2 = data.shape[4]
-    ldp = zeros((n1, n2))
-    rx, ry, rz = (1.0 - x), (1.0 - y), (1.0 - z)
+    ix = min(max(int(floor((x - x0) / dx)), 0), nx - 2)
+    ax = min(max((x - x0) / dx - ix, 0.0), 1.0)
+    return ix, ax
 
-    a1 = rx * ry * rz
-    a2 = x * ry * rz
-    b1 = rx * y * rz
-    b2 = rx * ry * z
-    c1 = x * ry * z
-    c2 = rx * y * z
-    d1 = x * y * rz
-    d2 = x * y * z
 
-    for i1 in range(n1):
-        for i2 in range(n2):
-            ldp[i1, i2] = (data[0, 0, 0, i1, i2] * a1 +
-                           data[1, 0, 0, i1, i2] * a2 +
-                           data[0, 1, 0, i1, i2] * b1 +
-                           data[0, 0, 1, i1, i2] * b2 +
-                           data[1, 0, 1, i1, i2] * c1 +
-                           data[0, 1, 1, i1, i2] * c2 +
-                           data[1, 1, 0, i1, i2] * d1 +
-                           data[1, 1, 1, i1, i2] * d2)
-    return ldp
-
-
-@njit
-def trilinear_interpolation_single(data, x, y, z, x0, dx, nx, y0, dy, ny, z0, dz, nz):
-    x = min(max(x, x0), x0 + nx * dx)
-    y = min(max(y, y0), y0 + ny * dy)
-    z = min(max(z, z0), z0 + nz * dz)
-    ix = int(floor((x - x0) / dx))
-    iy = int(floor((y - y0) / dy))
-    iz = int(floor((z - z0) / dz))
-    ax = (x - x0 - ix * dx) / dx
-    ay = (y - y0 - iy * dy) / dy
-    az = (z - z0 - iz * dz) / dz
-    return trilinear_interpolation_unit_cube(data[ix:ix + 2, iy:iy + 2, iz:iz + 2, :, :], ax, ay, az)
+@njit("Tuple((i8[:], f8[:]))(f8[:], f8, f8, i8)", cache=True)
+def grid_cells(xs, x0, dx, nx):
+    npv = xs.size
+    ixs = zeros(npv, int64)
+    axs = zeros(npv)
+    for i in range(npv):
+        ixs[i], axs[i] = grid_cell(xs[i], x0, dx, nx)
+    return ixs, axs
 
 
-@njit(parallel=True)
+# No explicit signature, since compiling a parallel kernel eagerly at import
+# would start the threading layer and hang the processes forked after that.
+@njit(parallel=True, fastmath=True, cache=True)
 def trilinear_interpolation_set(data, xs, ys, zs, x0, dx, nx, y0, dy, ny, z0, dz, nz):
     npv = xs.shape[0]
-    ldp = zeros((npv, data.shape[3], data.shape[4]))
-    for ipv in prange(npv):
-        ldp[ipv, :, :] = trilinear_interpolation_single(data, xs[ipv], ys[ipv], zs[ipv], x0, dx, nx, y0, dy, ny, z0, dz,
-                                                        nz)
-    return ldp
+    npb = data.shape[3]
+    nmu = data.shape[4]
+    ldp = zeros((npv, npb, nmu))
 
+    # Calculate the grid cells and the positions inside them once for all the parameter vectors
+    ixs, axs = grid_cells(xs, x0, dx, nx)
+    iys, ays = grid_cells(ys, y0, dy, ny)
+    izs, azs = grid_cells(zs, z0, dz, nz)
 
-@njit
-def integrate_profiles_single(mu, ldp):
-    nmu = mu.size
-    npb = ldp.shape[0]
-    ldi = zeros(npb)
+    # Parallelise over both the parameter vectors and the passbands, since
+    # each (ipv, ipb) profile can be interpolated independently.
+    for j in prange(npv * npb):
+        ipv = j // npb
+        ipb = j % npb
+        ix, iy, iz = ixs[ipv], iys[ipv], izs[ipv]
+        x, y, z = axs[ipv], ays[ipv], azs[ipv]
+        rx, ry, rz = (1.0 - x), (1.0 - y), (1.0 - z)
 
-    z = sqrt(1.0 - mu ** 2)
-    dz = z[1:] - z[:-1]
-    for ipb in range(npb):
-        for i in range(1, nmu):
-            ldi[ipb] += dz[i - 1] * 0.5 * (z[i] * ldp[ipb, i] + z[i - 1] * ldp[ipb, i - 1])
-    return 2.0 * pi * ldi
+        a1 = rx * ry * rz
+        a2 = x * ry * rz
+        b1 = rx * y * rz
+        b2 = rx * ry * z
+        c1 = x * ry * z
+        c2 = rx * y * z
+        d1 = x * y * rz
+        d2 = x * y * z
 
+        for imu in range(nmu):
+            ldp[ipv, ipb, imu] = (data[ix, iy, iz, ipb, imu] * a1 +
+                                  data[ix + 1, iy, iz, ipb, imu] * a2 +
+                                  data[ix, iy + 1, iz, ipb, imu] * b1 +
+                                  data[ix, iy, iz + 1, ipb, imu] * b2 +
+                                  data[ix + 1, iy, iz + 1, ipb, imu] * c1 +
+                                  data[ix, iy + 1, iz + 1, ipb, imu] * c2 +
+                                  data[ix + 1, iy + 1, iz, ipb, imu] * d1 +
+                                  data[ix + 1, iy + 1, iz + 1, ipb, imu] * d2)
+    return ldp
 
-@njit(parallel=True)
-def integrate_profiles_set(mu, ldp):
-    nmu = mu.size
-    npv = ldp.shape[0]
-    npb = ldp.shape[1]
-    ldi = zeros((npv, npb))
 
+@njit("f8[:](f8[:])", cache=True)
+def integration_weights(mu):
+    """Trapezoidal integration weights for the limb darkening profiles.
+
+    Returns the weights that give the integrated stellar flux as a dot product
+    with a limb darkening profile sampled at `mu`, and the dot product equals the
+    trapezoidal integral of 2 pi z I(z) over z = sqrt(1 - mu^2).
+    """
+    nmu = mu.size
     z = sqrt(1.0 - mu ** 2)
-    dz = z[1:] - z[:-1]
-    for j in prange(npv * npb):
-        ipv = j // npb
-        ipb = j % npb
-        for i in range(1, nmu):
-            ldi[ipv, ipb] += dz[i - 1] * 0.5 * (z[i] * ldp[ipv, ipb, i] + z[i - 1] * ldp[ipv, ipb, i - 1])
-    return 2.0 * pi * ldi
+    w = zeros(nmu)
+    for i in range(1, nmu):
+        hdz = 0.5 * (z[i] - z[i - 1])
+        w[i - 1] += hdz * z[i - 1]
+        w[i] += hdz * z[i]
+    return 2.0 * pi * w
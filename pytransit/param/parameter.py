@@ -113,6 +113,11 @@ class ParameterSet(list):
         self.bounds = None
         self.frozen = False
 
+    def __reduce__(self):
+        # Pickle restores the list items with `extend` before the instance attributes,
+        # so we pass the items to the constructor instead.
+        return self.__class__, (list(self),), self.__dict__
+
     def add_global_block(self, name, pars):
         start = len(self)
         stop = start + len(pars)
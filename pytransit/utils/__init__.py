@@ -17,4 +17,4 @@
 from .mdwarfs import md_rs_from_rho
 from .rv import mp_from_kiepms, surface_gravity
 from .phasecurves import doppler_beaming_factor, doppler_beaming_amplitude, ellipsoidal_variation_amplitude
-from .downsample import downsample_time_1d, downsample_time_2d
\ No newline at end of file
+from .downsample import downsample_time_1d, downsample_time_2d, downsample_lttb
\ No newline at end of file
@@ -15,7 +15,7 @@
 #  along with this program.  If not, see <https://www.gnu.org/licenses/>.
 
 from numba import njit
-from numpy import argsort, ceil, full, nan, zeros, sqrt, atleast_2d
+from numpy import argsort, ceil, full, nan, zeros, sqrt, atleast_2d, arange, floor, int64, ascontiguousarray
 
 
 @njit
@@ -92,3 +92,62 @@ def downsample_time_2d(time, vals, inttime=1., tmin=None, tmax=None, is_sorted=T
         if iend == npt:
             break
     return bt, bv, be
+
+
+@njit("i8[:](f8[:], f8[:], i8)", cache=True)
+def lttb_nb(x, y, nout):
+    npt = x.size
+    if nout < 3:
+        raise ValueError('LTTB downsampling needs at least three output points.')
+    if nout >= npt:
+        return arange(npt)
+
+    ids = zeros(nout, int64)
+    bsize = (npt - 2) / (nout - 2)
+    ia = 0
+    for i in range(nout - 2):
+        # Mean point of the next bucket
+        ns = int(floor((i + 1) * bsize)) + 1
+        ne = min(int(floor((i + 2) * bsize)) + 1, npt)
+        mx = x[ns:ne].mean()
+        my = y[ns:ne].mean()
+
+        # Point in the current bucket forming the largest triangle with the
+        # previously selected point and the mean point of the next bucket
+        amax, imax = -1.0, 0
+        for j in range(int(floor(i * bsize)) + 1, ns):
+            area = abs((x[ia] - mx) * (y[j] - y[ia]) - (x[ia] - x[j]) * (my - y[ia]))
+            if area > amax:
+                amax, imax = area, j
+        ids[i + 1] = imax
+        ia = imax
+    ids[-1] = npt - 1
+    return ids
+
+
+def downsample_lttb(x, y, nout: int = 5000):
+    """Indices of a visually representative subset of a time series.
+
+    Selects `nout` points from a time series using the Largest-Triangle-Three-Buckets
+    (LTTB) algorithm, which preserves the visual shape of the series when plotted. The
+    x values don't need to be sorted exactly, so bucket-sorted phases work as well.
+
+    Parameters
+    ----------
+    x
+        Sorted or roughly sorted x values (e.g., time or phase).
+    y
+        y values.
+    nout
+        Number of points to select, at least three.
+
+    Returns
+    -------
+        Indices of the selected points.
+    """
+    x, y = ascontiguousarray(x, dtype='d'), ascontiguousarray(y, dtype='d')
+    if nout < 3:
+        raise ValueError('LTTB downsampling needs at least three output points.')
+    if nout >= x.size:
+        return arange(x.size)
+    return lttb_nb(x, y, nout)
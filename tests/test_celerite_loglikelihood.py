@@ -0,0 +1,103 @@
+#  PyTransit: fast and easy exoplanet transit modelling in Python.
+#  Copyright (C) 2010-2020  Hannu Parviainen
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from unittest.mock import patch
+from numpy import linspace, zeros, exp, atleast_2d, sin, array, repeat, inf
+from numpy.random import default_rng
+from numpy.testing import assert_allclose
+
+from pytransit.param import ParameterSet, GParameter, UniformPrior as UP
+from pytransit.lpf.loglikelihood import CeleriteLogLikelihood
+from pytransit.lpf.loglikelihood import celeriteloglikelihood as cll
+
+
+class DummyLPF:
+    """A minimal stand-in for a log posterior function with a single light curve."""
+
+    def __init__(self, npt=500):
+        rng = default_rng(0)
+        self.timea = linspace(0.0, 5.0, npt)
+        self.ofluxa = self.transit_model(array([0.01]))[0] + 1e-3 * sin(3 * self.timea) + 2e-4 * rng.normal(size=npt)
+        self.lcids = zeros(npt, int)
+        self.noise_ids = [0]
+        self.ps = ParameterSet([GParameter('depth', 'transit depth', '', UP(0.0, 0.1), (0.0, 0.1))])
+        self.ps.freeze()
+
+    def transit_model(self, pv):
+        pv = atleast_2d(pv)
+        return 1.0 - pv[:, [0]] * exp(-((self.timea - 2.5) / 0.1) ** 2)
+
+
+class TestCeleriteLogLikelihood(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lpf = DummyLPF()
+        self.lnl = CeleriteLogLikelihood(self.lpf)
+        pvp = repeat(array([[0.01, -7.0, 0.0, -3.7]]), 6, 0)
+        pvp[:, 0] = linspace(0.005, 0.015, 6)
+        pvp[3:, 1:] = [-6.5, 0.5, -3.6]
+        self.pvp = pvp
+
+    def test_predict_baseline_batch(self):
+        bl = self.lnl.predict_baseline_batch(self.pvp)
+        self.assertEqual(bl.shape, (self.pvp.shape[0], self.lpf.timea.size))
+        for ipv, pv in enumerate(self.pvp):
+            assert_allclose(bl[ipv], self.lnl.predict_baseline(pv), rtol=1e-12)
+
+    def test_predict_baseline_batch_with_models(self):
+        models = self.lpf.transit_model(self.pvp)
+        assert_allclose(self.lnl.predict_baseline_batch(self.pvp, models), self.lnl.predict_baseline_batch(self.pvp),
+                        rtol=1e-12)
+
+
+@unittest.skipUnless(cll.with_celerite and cll.with_celerite2, 'requires both celerite and celerite2')
+class TestCeleriteBackends(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lpf = DummyLPF()
+        self.pvp = array([[0.010, -7.0, 0.0, -3.7],
+                          [0.012, -6.5, 0.5, -3.6],
+                          [0.008, -8.0, -1.0, -3.8]])
+
+    def test_celerite2_matches_celerite(self):
+        models = self.lpf.transit_model(self.pvp)
+        lnl2 = CeleriteLogLikelihood(self.lpf)
+        lnlike2, baseline2 = lnl2(self.pvp, models), lnl2.predict_baseline_batch(self.pvp, models)
+        with patch.object(cll, 'with_celerite2', False):
+            lnl1 = CeleriteLogLikelihood(DummyLPF())
+            lnlike1, baseline1 = lnl1(self.pvp, models), lnl1.predict_baseline_batch(self.pvp, models)
+        assert_allclose(lnlike2, lnlike1, rtol=1e-11)
+        assert_allclose(baseline2, baseline1, rtol=1e-11)
+
+    def test_failed_factorisation(self):
+        lnl = CeleriteLogLikelihood(self.lpf)
+        for hps in ([400.0, 0.0, -3.7], [0.0, -400.0, -3.7]):
+            pv = array([0.01, *hps])
+            self.assertEqual(lnl.compute_gp_lnlikelihood(pv, self.lpf.transit_model(pv)[0]), -inf)
+            with self.assertRaises(cll.LinAlgError):
+                lnl.predict_baseline(pv)
+            with self.assertRaises(cll.LinAlgError):
+                lnl.predict_baseline_batch(pv)
+
+        # The hyperparameters of a factorisation that raised an error are not cached
+        pv = array([0.01, 400.0, 0.0, -3.7])
+        lnl.compute_gp_lnlikelihood(pv, self.lpf.transit_model(pv)[0])
+        self.assertIsNone(lnl._computed_hps)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,109 @@
+#  PyTransit: fast and easy exoplanet transit modelling in Python.
+#  Copyright (C) 2010-2020  Hannu Parviainen
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from math import floor
+from numpy import array, ones, arange, digitize, full, nan, zeros, sqrt, isfinite, ceil, sort, sin, argsort
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+
+from pytransit.lpf.tesslpf import downsample_time, bucket_argsort
+from pytransit.utils.downsample import lttb_nb, downsample_lttb
+
+
+def downsample_time_reference(time, vals, inttime=1.):
+    duration = time.max() - time.min()
+    nbins = int(ceil(duration / inttime))
+    bins = arange(nbins)
+    edges = time[0] + bins * inttime
+    bids = digitize(time, edges) - 1
+    bt, bv, be = full(nbins, nan), zeros(nbins), zeros(nbins)
+    for i, bid in enumerate(bins):
+        bmask = bid == bids
+        if bmask.sum() > 0:
+            bt[i] = time[bmask].mean()
+            bv[i] = vals[bmask].mean()
+            if bmask.sum() > 2:
+                be[i] = vals[bmask].std() / sqrt(bmask.sum())
+            else:
+                be[i] = nan
+    m = isfinite(be)
+    return bt[m], bv[m], be[m]
+
+
+def lttb_reference(x, y, nout):
+    every = (x.size - 2) / (nout - 2)
+    ids, a = [0], 0
+    for i in range(nout - 2):
+        ns, ne = floor((i + 1) * every) + 1, min(floor((i + 2) * every) + 1, x.size)
+        mx, my = x[ns:ne].mean(), y[ns:ne].mean()
+        areas = [abs((x[a] - mx) * (y[j] - y[a]) - (x[a] - x[j]) * (my - y[a])) for j in range(floor(i * every) + 1, ns)]
+        a = floor(i * every) + 1 + max(range(len(areas)), key=areas.__getitem__)
+        ids.append(a)
+    ids.append(x.size - 1)
+    return array(ids)
+
+
+class TestDownsampleTime(unittest.TestCase):
+
+    def test_against_reference(self):
+        rng = default_rng(0)
+        for npt, inttime in ((10, 0.05), (1000, 0.005), (20000, 0.001)):
+            time = sort(rng.uniform(-0.3, 0.3, npt))
+            vals = 1.0 + 1e-3 * rng.normal(size=npt)
+            for r, o in zip(downsample_time_reference(time, vals, inttime), downsample_time(time, vals, inttime)):
+                self.assertEqual(r.shape, o.shape)
+                assert_allclose(o, r, rtol=1e-12, atol=1e-15)
+
+    def test_zero_duration(self):
+        for time in (array([1.0]), array([1.0, 1.0, 1.0])):
+            bt, bv, be = downsample_time(time, ones(time.size), 0.1)
+            self.assertEqual(bt.size, 0)
+            self.assertEqual(bv.size, 0)
+            self.assertEqual(be.size, 0)
+
+
+class TestBucketArgsort(unittest.TestCase):
+
+    def test_against_stable_argsort(self):
+        x = default_rng(0).uniform(-1.0, 1.0, 100000)
+        for dx in (1e-4, 1e-3, 0.3, 10.0):
+            keys = ((x - x.min()) / dx).astype(int)
+            assert_array_equal(bucket_argsort(x, dx), argsort(keys, kind='stable'))
+
+
+class TestLTTB(unittest.TestCase):
+
+    def setUp(self) -> None:
+        rng = default_rng(0)
+        self.x = sort(rng.uniform(0.0, 1.0, 5000))
+        self.y = sin(20 * self.x) + 0.1 * rng.normal(size=self.x.size)
+
+    def test_against_reference(self):
+        for nout in (3, 4, 100, 777):
+            assert_array_equal(lttb_nb(self.x, self.y, nout), lttb_reference(self.x, self.y, nout))
+
+    def test_small_nout(self):
+        assert_array_equal(downsample_lttb(self.x[:10], self.y[:10], 500), arange(10))
+        for nout in (0, 1, 2):
+            with self.assertRaises(ValueError):
+                downsample_lttb(self.x, self.y, nout)
+            with self.assertRaises(ValueError):
+                lttb_nb(self.x, self.y, nout)
+
+
+if __name__ == '__main__':
+    unittest.main()
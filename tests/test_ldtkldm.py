@@ -0,0 +1,59 @@
+#  PyTransit: fast and easy exoplanet transit modelling in Python.
+#  Copyright (C) 2010-2020  Hannu Parviainen
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from numpy import linspace, c_, repeat
+from numpy.random import default_rng
+from numpy.testing import assert_array_equal
+
+from pytransit.models.ldtkldm import LDTkLDModel
+from pytransit.models.numba.ldtkldm import integration_weights
+
+
+class TestLDTkLDModel(unittest.TestCase):
+
+    def setUp(self) -> None:
+        # Set up the interpolation grid directly, since creating the profiles requires LDTk.
+        rng = default_rng(0)
+        self.mu = mu = linspace(1.0, 1e-3, 40)
+        self.m = m = LDTkLDModel.__new__(LDTkLDModel)
+        m.mu, m.nmu, m.npb = mu, mu.size, 2
+        m.weights = integration_weights(mu)
+        m.profiles = rng.uniform(0.2, 1.0, (3, 4, 5, 2, mu.size))
+        m.teff0, m.dteff, m.nteff = 4000., 1000., 3
+        m.logg0, m.dlogg, m.nlogg = 4.0, 0.3, 4
+        m.metal0, m.dmetal, m.nmetal = -0.5, 0.25, 5
+        m._cached_sp = m._cached_ld = None
+        self.x = c_[rng.uniform(4000, 6000, 6), rng.uniform(4, 4.9, 6), rng.uniform(-.5, .5, 6)]
+
+    def test_cached_profiles_are_not_modified_by_the_caller(self):
+        ldp, ldi = self.m(self.mu, self.x)
+        ldp0, ldi0 = ldp.copy(), ldi.copy()
+        ldp[:] = 0.0
+        ldi[:] = 0.0
+        ldp, ldi = self.m(self.mu, self.x)
+        assert_array_equal(ldp, ldp0)
+        assert_array_equal(ldi, ldi0)
+
+    def test_frozen_stellar_parameters(self):
+        ldp, ldi = self.m(self.mu, self.x[:1])
+        ldpf, ldif = self.m(self.mu, repeat(self.x[:1], 5, 0))
+        assert_array_equal(ldpf, repeat(ldp, 5, 0))
+        assert_array_equal(ldif, repeat(ldi, 5, 0))
+
+
+if __name__ == '__main__':
+    unittest.main()
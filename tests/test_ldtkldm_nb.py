@@ -0,0 +1,58 @@
+#  PyTransit: fast and easy exoplanet transit modelling in Python.
+#  Copyright (C) 2010-2020  Hannu Parviainen
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import unittest
+from numpy import linspace, sqrt, pi, zeros, array, arange, c_, clip
+from numpy.random import default_rng
+from numpy.testing import assert_allclose, assert_array_equal
+from scipy.interpolate import RegularGridInterpolator
+
+from pytransit.models.numba.ldtkldm import integration_weights, grid_cells, trilinear_interpolation_set
+
+
+class TestLDTkLDModelNB(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.rng = default_rng(0)
+        self.mu = linspace(1e-3, 1.0, 50)[::-1].copy()
+
+    def test_grid_cells(self):
+        ixs, axs = grid_cells(array([-1.0, 0.0, 0.25, 1.0, 1.9, 2.0, 3.0]), 0.0, 1.0, 3)
+        assert_array_equal(ixs, [0, 0, 0, 1, 1, 1, 1])
+        assert_allclose(axs, [0.0, 0.0, 0.25, 0.0, 0.9, 1.0, 1.0])
+
+    def test_trilinear_interpolation_set(self):
+        profiles = self.rng.uniform(0.2, 1.0, (3, 4, 5, 2, self.mu.size))
+        teff = array([4000., 4999., 5500., 6000., 7000., 3000.])
+        logg = array([4.0, 4.2, 4.5, 4.9, 5.0, 3.0])
+        metal = array([0.0, 0.1, -0.3, 0.25, 0.5, -1.0])
+        ldp = trilinear_interpolation_set(profiles, teff, logg, metal, 4000., 1000., 3, 4.0, 0.3, 4, -0.5, 0.25, 5)
+
+        rgi = RegularGridInterpolator((4000. + 1000. * arange(3), 4.0 + 0.3 * arange(4), -0.5 + 0.25 * arange(5)), profiles)
+        points = c_[clip(teff, 4000., 6000.), clip(logg, 4.0, 4.9), clip(metal, -0.5, 0.5)]
+        assert_allclose(ldp, rgi(points), rtol=1e-12)
+
+    def test_integration_weights(self):
+        ldp = self.rng.uniform(0.2, 1.0, (7, 2, self.mu.size))
+        z = sqrt(1.0 - self.mu ** 2)
+        ldi = zeros((7, 2))
+        for i in range(1, self.mu.size):
+            ldi += (z[i] - z[i - 1]) * 0.5 * (z[i] * ldp[:, :, i] + z[i - 1] * ldp[:, :, i - 1])
+        assert_allclose(ldp.dot(integration_weights(self.mu)), 2.0 * pi * ldi, rtol=1e-13)
+
+
+if __name__ == '__main__':
+    unittest.main()
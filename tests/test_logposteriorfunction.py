@@ -0,0 +1,148 @@
+#  PyTransit: fast and easy exoplanet transit modelling in Python.
+#  Copyright (C) 2010-2020  Hannu Parviainen
+#
+#  This program is free software: you can redistribute it and/or modify
+#  it under the terms of the GNU General Public License as published by
+#  the Free Software Foundation, either version 3 of the License, or
+#  (at your option) any later version.
+#
+#  This program is distributed in the hope that it will be useful,
+#  but WITHOUT ANY WARRANTY; without even the implied warranty of
+#  MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE.  See the
+#  GNU General Public License for more details.
+#
+#  You should have received a copy of the GNU General Public License
+#  along with this program.  If not, see <https://www.gnu.org/licenses/>.
+
+import pickle
+import unittest
+from multiprocessing.pool import ThreadPool
+from types import SimpleNamespace
+
+from numpy import atleast_2d, sqrt, concatenate, linspace, isfinite, arange
+from numpy.random import default_rng, seed
+from numpy.testing import assert_allclose, assert_array_equal
+
+from pytransit import BaseLPF
+from pytransit.lpf.logposteriorfunction import LogPosteriorFunction, gelman_rubin
+from pytransit.lpf.loglikelihood import CeleriteLogLikelihood
+from pytransit.param import ParameterSet, GParameter, NormalPrior as NP
+
+
+class GaussianLPF(LogPosteriorFunction):
+    def __init__(self):
+        super().__init__('gaussian')
+        self.ps = ParameterSet([GParameter('a', 'a', '', NP(0.0, 1.0), (-10, 10)),
+                                GParameter('b', 'b', '', NP(1.0, 2.0), (-10, 10))])
+        self.ps.freeze()
+
+    def lnposterior(self, pv):
+        pv = atleast_2d(pv)
+        return -0.5 * (pv[:, 0] ** 2 + ((pv[:, 1] - 1.0) / 2.0) ** 2)
+
+
+class CeleriteLPF(BaseLPF):
+    def _init_lnlikelihood(self):
+        self._add_lnlikelihood_model(CeleriteLogLikelihood(self))
+
+
+class TestGelmanRubin(unittest.TestCase):
+
+    def test_reference(self):
+        chains = default_rng(0).normal(size=(4, 100, 3))
+        chains[1, :, 2] += 5.0
+        n = chains.shape[1]
+        for ip in range(chains.shape[2]):
+            means = chains[:, :, ip].mean(1)
+            w = sum(((chains[ic, :, ip] - means[ic]) ** 2).sum() / (n - 1) for ic in range(4)) / 4
+            b = n * ((means - means.mean()) ** 2).sum() / 3
+            assert_allclose(gelman_rubin(chains)[ip], sqrt(((n - 1) / n * w + b / n) / w), rtol=1e-12)
+
+    def test_converged_and_unconverged_chains(self):
+        chains = default_rng(0).normal(size=(4, 10000, 2))
+        chains[1, :, 1] += 5.0
+        rhat = gelman_rubin(chains)
+        self.assertLess(rhat[0], 1.01)
+        self.assertGreater(rhat[1], 1.5)
+
+
+class TestSampleMCMCParallel(unittest.TestCase):
+
+    def setUp(self) -> None:
+        self.lpf = GaussianLPF()
+        self.pop0 = default_rng(0).normal(size=(3, 8, 2))
+
+    def test_merged_backend(self):
+        with ThreadPool(3) as pool:
+            rhat = self.lpf.sample_mcmc_parallel(50, thin=5, nchains=3, population=self.pop0, pool=pool)
+        sampler = self.lpf.sampler
+        self.assertEqual(rhat.shape, (2,))
+        self.assertEqual(sampler.chain.shape, (24, 10, 2))
+        self.assertEqual(sampler.lnprobability.shape, (24, 10))
+        self.assertEqual(sampler.iteration, 10)
+        assert_allclose(sampler.lnprobability, self.lpf.lnposterior(sampler.chain.reshape([-1, 2])).reshape([24, 10]))
+        assert_array_equal(sampler.chain[:, -1, :], sampler.get_last_sample().coords)
+        self.assertEqual(self.lpf.posterior_samples().shape, (240, 2))
+
+    def test_burn(self):
+        with ThreadPool(3) as pool:
+            rhat = self.lpf.sample_mcmc_parallel(50, thin=5, nchains=3, population=self.pop0, pool=pool, burn=4)
+        chains = self.lpf.sampler.chain
+        assert_allclose(rhat, gelman_rubin(concatenate([chains[:8, 4:], chains[8:16, 4:], chains[16:, 4:]])
+                                           .reshape([3, -1, 2])))
+        with self.assertRaises(ValueError):
+            self.lpf.sample_mcmc_parallel(50, thin=5, nchains=3, population=self.pop0, burn=10)
+
+    def test_continue_from_sampler(self):
+        with ThreadPool(3) as pool:
+            self.lpf.sample_mcmc_parallel(10, thin=5, nchains=3, population=self.pop0, pool=pool)
+            last = self.lpf.sampler.chain[:, -1, :].copy()
+            with self.assertRaises(ValueError):
+                self.lpf.sample_mcmc_parallel(10, thin=5, nchains=5, pool=pool)
+            self.lpf.sample_mcmc_parallel(10, thin=5, nchains=3, pool=pool)
+        self.assertEqual(self.lpf.sampler.chain.shape, (24, 2, 2))
+
+    def test_subsample_posterior(self):
+        # A synthetic chain with distinct samples, since the MCMC chain repeats the rejected steps
+        self.lpf.sampler = SimpleNamespace(chain=arange(24 * 10 * 2, dtype='d').reshape([24, 10, 2]))
+        s = self.lpf._subsample_posterior(100, burn=2)
+        self.assertEqual(s.shape, (100, 2))
+        self.assertEqual(len({tuple(r) for r in s}), 100)
+        samples = {tuple(r) for r in self.lpf.posterior_samples(burn=2).values}
+        self.assertTrue(all(tuple(r) in samples for r in s))
+        self.assertEqual(self.lpf._subsample_posterior(10000).shape, (240, 2))
+
+        seed(0)
+        s1 = self.lpf._subsample_posterior(50)
+        seed(0)
+        assert_array_equal(self.lpf._subsample_posterior(50), s1)
+        assert_array_equal(self.lpf._subsample_posterior(50, rng=default_rng(1)),
+                           self.lpf._subsample_posterior(50, rng=default_rng(1)))
+
+    def test_parameter_set_pickle(self):
+        ps = pickle.loads(pickle.dumps(self.lpf.ps))
+        self.assertTrue(ps.frozen)
+        self.assertEqual(ps.names, self.lpf.ps.names)
+        assert_array_equal(ps.bounds, self.lpf.ps.bounds)
+
+
+class TestSampleMCMCParallelBaseLPF(unittest.TestCase):
+
+    def test_thread_pool_log_probabilities(self):
+        # The ensembles share the process, so they must not share the LPF caches
+        rng = default_rng(0)
+        times = [linspace(i, i + 0.2, 150) for i in range(3)]
+        fluxes = [1 + 1e-3 * rng.normal(size=t.size) for t in times]
+        lpf = CeleriteLPF('test', 'TESS', times=times, fluxes=fluxes)
+        pop0 = lpf.create_pv_population(72).reshape([3, 24, -1])
+        with ThreadPool(3) as pool:
+            lpf.sample_mcmc_parallel(20, thin=1, nchains=3, population=pop0, pool=pool)
+        chain, lnp = lpf.sampler.chain, lpf.sampler.lnprobability
+        lnpr = lpf.lnposterior(chain.reshape([-1, chain.shape[2]])).reshape(lnp.shape)
+        m = isfinite(lnpr)
+        assert_array_equal(isfinite(lnp), m)
+        assert_allclose(lnp[m], lnpr[m], rtol=1e-10)
+
+
+if __name__ == '__main__':
+    unittest.main()